@@ -1,14 +1,49 @@
+import logging
+import re
+import types
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from src.models import ontology_mapper_st as oms
 from src.models import ontology_mapper_lm as oml
 from src.models import ontology_mapper_rag as omr
 from src.models import ontology_mapper_bi_encoder as ombe
-import pandas as pd
 import numpy as np
-from thefuzz import fuzz
+import pandas as pd
+from rapidfuzz import fuzz
 from src.CustomLogger.custom_logger import CustomLogger
 
 logger = CustomLogger()
 ABBR_DICT_PATH = "data/corpus/oncotree_code_to_name.csv"
+_OBO_CODE_RE = re.compile(r'(C\d+)')
+
+
+@lru_cache(maxsize=1)
+def _load_abbr_dict() -> types.MappingProxyType:
+    """
+    Loads the abbreviation mapping (short name (code) → full name) once per process.
+    The result is read-only since it is shared by every engine instance; a
+    missing file is cached as an empty mapping so repeated lookups stay free.
+    """
+    try:
+        mapping_df = pd.read_csv(ABBR_DICT_PATH,
+                                 usecols=["code", "name"],
+                                 dtype=str)
+    except FileNotFoundError:
+        return types.MappingProxyType({})
+    return types.MappingProxyType(
+        dict(
+            zip(mapping_df["code"].str.strip(),
+                mapping_df["name"].str.strip())))
+
+
+@lru_cache(maxsize=8)
+def _norm_corpus(corpus_tuple: tuple[str, ...]) -> pd.Index:
+    """
+    Returns the unique stripped, lower-cased corpus terms, memoized across engine instances.
+    A pd.Index keeps its hash table, so lookups against it do not rebuild it.
+    """
+    terms = dict.fromkeys(c.strip().lower() for c in corpus_tuple)
+    return pd.Index(list(terms), dtype=object)
 
 
 class OntoMapEngine:
@@ -60,11 +95,17 @@ class OntoMapEngine:
         self.category = category
         self.corpus = list(
             dict.fromkeys(corpus))  # Remove duplicates while preserving order
+        self._corpus_tuple = tuple(self.corpus)
         self.topk = topk
         self.s2_strategy = s2_strategy
         self.s3_strategy = s3_strategy
         self.s3_threshold = s3_threshold
         self.cura_map = cura_map
+        # Indexed copy of cura_map so curated lookups go through a
+        # vectorized reindex instead of a per-row dict map
+        self._cura_series = pd.Series(cura_map,
+                                      name="curated_ontology",
+                                      dtype=object)
         self.other_params = other_params
         if 'test_or_prod' not in self.other_params.keys():
             raise ValueError(
@@ -88,8 +129,7 @@ class OntoMapEngine:
                 )
             corpus_df = self._normalize_df(corpus_df, need_code=True)
             self.other_params["corpus_df"] = corpus_df
-            self.corpus_s3 = corpus_df["official_label"].astype(
-                str).unique().tolist()
+            self.corpus_s3 = corpus_df["official_label"].unique().tolist()
 
         self._logger.info("Initialized OntoMap Engine")
         self._logger.info(f"Stage 1: Exact matching")
@@ -127,7 +167,7 @@ class OntoMapEngine:
                 if "obo_id" in df.columns:
                     # Extract code part from obo_id, e.g., "NCIT:C156482" -> "C156482"
                     df["clean_code"] = df["obo_id"].astype(str).str.extract(
-                        r'(C\d+)', expand=False)
+                        _OBO_CODE_RE, expand=False)
                     self._logger.info(
                         "`clean_code` not found — generated from `obo_id`.")
                 else:
@@ -144,42 +184,49 @@ class OntoMapEngine:
 
         return df
 
-    def _exact_matching(self):
+    def _exact_matching(self, stripped: pd.Series) -> pd.Series:
         """
         Performs exact matching of queries to the corpus.
 
+        Args:
+            stripped (pd.Series): The whitespace-stripped queries, aligned with self.query.
+
         Returns:
-            list: The list of exact matches from the query.
+            pd.Series: Boolean mask over self.query, True for exact matches.
         """
-        corpus_normalized = {c.strip().lower() for c in self.corpus}
-        return [
-            q for q in self.query if q.strip().lower() in corpus_normalized
-        ]
-
-    def _map_shortname_to_fullname(self, non_exact_list: list[str]) -> dict:
+        corpus_index = _norm_corpus(self._corpus_tuple)
+        return pd.Series(
+            corpus_index.get_indexer(stripped.str.lower()) >= 0,
+            index=stripped.index)
+
+    def _map_shortname_to_fullname(self,
+                                   non_exact_list: list[str],
+                                   stripped: pd.Series = None
+                                   ) -> tuple[dict, list[str]]:
         """
         Return a dict: original_value -> updated_value
         (short name (code) → full name if exists, otherwise keep original)
+        together with the updated values in non_exact_list order.
+        `stripped` may carry the already-stripped values of non_exact_list.
         """
-        try:
-            mapping_df = pd.read_csv(ABBR_DICT_PATH)
-            short_to_name = dict(
-                zip(mapping_df["code"].str.strip(),
-                    mapping_df["name"].str.strip()))
-        except FileNotFoundError:
+        short_to_name = _load_abbr_dict()
+        if not short_to_name:
             self._logger.warning(
                 "Abbreviation mapping file not found. Skipping abbreviation replacement."
             )
-            short_to_name = {}
 
-        replaced = {}
-        for q in non_exact_list:
-            q_strip = q.strip()
-            replaced[q] = short_to_name.get(q_strip, q_strip)
-            if q_strip in short_to_name:
-                self._logger.info(
-                    f"Replaced: {q_strip} → {short_to_name[q_strip]}")
-        return replaced
+        s = pd.Series(non_exact_list, dtype=object)
+        if stripped is None:
+            stripped = s.str.strip()
+        else:
+            stripped = stripped.reset_index(drop=True)
+        mapped = stripped.map(short_to_name).fillna(stripped)
+        replaced_mask = mapped.ne(stripped)
+        if replaced_mask.any():
+            self._logger.info(
+                f"Replaced {replaced_mask.sum()} shortnames via abbrev dict")
+        updated_list = mapped.tolist()
+        return dict(zip(non_exact_list, updated_list)), updated_list
 
     def _om_model_from_strategy(self, strategy: str,
                                 non_exact_query_list: list[str]):
@@ -235,6 +282,69 @@ class OntoMapEngine:
                 f"strategy should be 'st', 'lm', 'rag', or 'rag_bie', got '{strategy}'"
             )
 
+    def _stage2_results(self, s2_model, replace_df: pd.DataFrame,
+                        updated_cura_map: dict) -> pd.DataFrame:
+        """
+        Runs full topk Stage 2 matching for the model's queries and merges the
+        results back onto the original values.
+
+        Args:
+            s2_model (object): The Stage 2 OntoMap model instance.
+            replace_df (pd.DataFrame): original_value → updated_value pairs to fan out to.
+            updated_cura_map (dict): The curated mapping keyed by updated value.
+
+        Returns:
+            pd.DataFrame: Stage 2 results keyed by original_value.
+        """
+        s2_res = s2_model.get_match_results(cura_map=updated_cura_map,
+                                            topk=self.topk,
+                                            test_or_prod=self._test_or_prod)
+
+        # Merge back to original_value
+        s2_res.rename(columns={"original_value": "updated_value"},
+                      inplace=True)
+        s2_res = pd.merge(replace_df, s2_res, on="updated_value", how="left")
+        s2_res["curated_ontology"] = self._cura_series.reindex(
+            s2_res["original_value"].to_numpy()).fillna("Not Found").to_numpy()
+        s2_res['stage'] = 2
+
+        return s2_res
+
+    def _run_stage3(self, replace_df_s3: pd.DataFrame,
+                    updated_cura_map: dict) -> pd.DataFrame:
+        """
+        Runs Stage 3 (RAG/RAG_BIE) on the low-confidence Stage 2 queries.
+
+        Args:
+            replace_df_s3 (pd.DataFrame): original_value → updated_value pairs sent to Stage 3,
+                reused from the Stage 2 shortname replacement.
+            updated_cura_map (dict): The curated mapping keyed by updated value.
+
+        Returns:
+            pd.DataFrame: Stage 3 results keyed by original_value.
+        """
+        # Run Stage 3 model on unique updated values
+        unique_updated_s3 = replace_df_s3['updated_value'].unique().tolist()
+        s3_model = self._om_model_from_strategy(self.s3_strategy,
+                                                unique_updated_s3)
+        s3_res = s3_model.get_match_results(
+            cura_map=updated_cura_map,
+            topk=self.topk,
+            test_or_prod=self._test_or_prod)
+
+        # Merge back to original_value
+        s3_res.rename(columns={"original_value": "updated_value"},
+                      inplace=True)
+        s3_res = pd.merge(replace_df_s3,
+                          s3_res,
+                          on="updated_value",
+                          how="left")
+        s3_res["curated_ontology"] = self._cura_series.reindex(
+            s3_res["original_value"].to_numpy()).fillna("Not Found").to_numpy()
+        s3_res['stage'] = 3
+
+        return s3_res
+
     def run(self):
         """
         Runs the OntoMap Engine with multi-stage cascade.
@@ -248,23 +358,34 @@ class OntoMapEngine:
 
         # ========== Stage 1: Exact Matching ==========
         self._logger.info("Stage 1: Exact Matching")
-        exact_matches = self._exact_matching()
-        self._logger.info(f"Exact matches: {len(exact_matches)}")
-
-        stage1_matches = exact_matches
-
-        # Create DataFrame for Stage 1 matches
-        exact_df = pd.DataFrame({'original_value': stage1_matches})
-        exact_df['curated_ontology'] = exact_df['original_value'].map(
-            self.cura_map).fillna(exact_df['original_value'])
-        exact_df['match_level'] = 1
-        exact_df['stage'] = 1
+        # Strip every query once; Stage 1 lower-cases these and the Stage 2
+        # shortname replacement reuses them for the non-exact queries
+        query_series = pd.Series(self.query, dtype=object)
+        stripped = query_series.str.strip()
+        exact_mask = self._exact_matching(stripped)
+        self._logger.info(f"Exact matches: {int(exact_mask.sum())}")
+
+        # Create DataFrame for Stage 1 matches; all columns are collected
+        # first so the frame is allocated once regardless of topk
+        original = query_series[exact_mask].reset_index(drop=True)
+        curated = self._cura_series.reindex(original.to_numpy()).to_numpy()
+        curated = np.where(pd.isna(curated), original.to_numpy(), curated)
+        exact_cols = {
+            'original_value': original.to_numpy(),
+            'curated_ontology': curated,
+            'match_level': 1,
+            'stage': 1
+        }
+        exact_scores = np.ones(len(original), dtype=np.float32)
         for i in range(1, self.topk + 1):
-            exact_df[f'top{i}_match'] = exact_df['curated_ontology']
-            exact_df[f'top{i}_score'] = 1.00
-
-        # Remaining queries for Stage 2
-        non_exact_matches_ls = list(np.setdiff1d(self.query, stage1_matches))
+            exact_cols[f'top{i}_match'] = curated
+            exact_cols[f'top{i}_score'] = exact_scores
+        exact_df = pd.DataFrame(exact_cols, index=original.index)
+
+        # Remaining queries for Stage 2, in input order with duplicates
+        # collapsed
+        non_exact_mask = ~exact_mask & ~query_series.duplicated()
+        non_exact_matches_ls = query_series[non_exact_mask].tolist()
         self._logger.info(
             f"Remaining for Stage 2: {len(non_exact_matches_ls)}")
 
@@ -276,8 +397,8 @@ class OntoMapEngine:
         # ========== Stage 2: LM/ST ==========
         self._logger.info(f"Stage 2: {self.s2_strategy.upper()} Matching")
         self._logger.info("Replacing shortNames using rule-based name mapping")
-        mapping_dict = self._map_shortname_to_fullname(non_exact_matches_ls)
-        updated_queries = [mapping_dict[q] for q in non_exact_matches_ls]
+        mapping_dict, updated_queries = self._map_shortname_to_fullname(
+            non_exact_matches_ls, stripped[non_exact_mask])
 
         replace_df = pd.DataFrame({
             "original_value": non_exact_matches_ls,
@@ -285,29 +406,22 @@ class OntoMapEngine:
         })
 
         updated_cura_map = {
-            mapping_dict[k]: v
-            for k, v in self.cura_map.items() if k in mapping_dict
+            mapping_dict[k]: self.cura_map[k]
+            for k in mapping_dict if k in self.cura_map
         }
 
-        # Run Stage 2 model
+        # Stage 2 model runs on unique updated values; the merge in
+        # _stage2_results fans results back out to every original_value
+        unique_updated = list(dict.fromkeys(updated_queries))
         s2_model = self._om_model_from_strategy(self.s2_strategy,
-                                                updated_queries)
-        s2_res = s2_model.get_match_results(cura_map=updated_cura_map,
-                                            topk=self.topk,
-                                            test_or_prod=self._test_or_prod)
-
-        # Merge back to original_value
-        s2_res.rename(columns={"original_value": "updated_value"},
-                      inplace=True)
-        s2_res = pd.merge(replace_df, s2_res, on="updated_value", how="left")
-        s2_res["curated_ontology"] = s2_res["original_value"].map(
-            self.cura_map).fillna("Not Found")
-        s2_res['stage'] = 2
-
-        self._logger.info(f"Stage 2 completed: {len(s2_res)} queries")
+                                                unique_updated)
 
         # ========== Stage 3: RAG/RAG_BIE (Optional) ==========
         if self.s3_strategy is None:
+            s2_res = self._stage2_results(s2_model, replace_df,
+                                          updated_cura_map)
+            self._logger.info(f"Stage 2 completed: {len(s2_res)} queries")
+
             # No Stage 3, combine Stage 1 + Stage 2
             self._logger.info("Stage 3: Disabled")
             combined_results = pd.concat([exact_df, s2_res], ignore_index=True)
@@ -320,30 +434,32 @@ class OntoMapEngine:
             return combined_results
 
         else:
-            # Check which queries need Stage 3 (top1_score < threshold)
+            # Check which queries need Stage 3 (top1_score < threshold).
+            # The model searches every query once here and caches the hits;
+            # result frames are built just for the queries that stay in Stage 2.
             self._logger.info(f"Stage 3: {self.s3_strategy.upper()} Matching")
+            top1_df = s2_model.get_top1_scores(topk=self.topk)
 
-            top1_score_col = 'top1_score'
-            if top1_score_col not in s2_res.columns:
-                self._logger.warning(
-                    f"{top1_score_col} not found in Stage 2 results. Skipping Stage 3."
+            if self._logger.isEnabledFor(logging.DEBUG):
+                self._logger.debug(
+                    f"S2 result top1_score dtype: {top1_df['top1_score'].dtype}"
+                )
+            if top1_df['top1_score'].dtype.kind != 'f':
+                raise TypeError(
+                    f"Stage 2 top1_score must be a float column, got {top1_df['top1_score'].dtype}"
                 )
-                combined_results = pd.concat([exact_df, s2_res],
-                                             ignore_index=True)
-                return combined_results
-
-            self._logger.info(f"S2 result columns: {s2_res.columns.tolist()}")
-            self._logger.info(
-                f"S2 result top1_score dtype: {s2_res['top1_score'].dtype}")
-            self._logger.info(
-                f"S2 result top1_score unique values (first 10): {s2_res['top1_score'].unique()[:10]}"
-            )
             # Identify low-confidence queries
-            low_confidence_mask = pd.to_numeric(
-                s2_res[top1_score_col],
-                errors='coerce').fillna(0) < self.s3_threshold
-            queries_for_s3 = s2_res.loc[low_confidence_mask,
-                                        'original_value'].tolist()
+            low_confidence_mask = top1_df['top1_score'].to_numpy(
+            ) < self.s3_threshold
+            # top1_df holds one row per unique updated value, so the mask
+            # splits the Stage 2 model queries directly
+            updated_for_s3 = top1_df['original_value'].to_numpy()[
+                low_confidence_mask]
+            updated_for_s2 = top1_df['original_value'].to_numpy()[
+                ~low_confidence_mask]
+            s3_mask = replace_df['updated_value'].isin(updated_for_s3)
+            queries_for_s3 = replace_df.loc[s3_mask,
+                                            'original_value'].tolist()
 
             self._logger.info(
                 f"Queries with top1_score < {self.s3_threshold}: {len(queries_for_s3)}"
@@ -351,6 +467,10 @@ class OntoMapEngine:
 
             if not queries_for_s3:
                 self._logger.info("No queries require Stage 3.")
+                s2_res = self._stage2_results(s2_model, replace_df,
+                                              updated_cura_map)
+                self._logger.info(
+                    f"Stage 2 completed: {len(s2_res)} queries")
                 combined_results = pd.concat([exact_df, s2_res],
                                              ignore_index=True)
 
@@ -362,47 +482,29 @@ class OntoMapEngine:
 
                 return combined_results
 
-            # Apply shortname replacement for Stage 3 queries
-            mapping_dict_s3 = self._map_shortname_to_fullname(queries_for_s3)
-            updated_queries_s3 = [mapping_dict_s3[q] for q in queries_for_s3]
-
-            replace_df_s3 = pd.DataFrame({
-                "original_value": queries_for_s3,
-                "updated_value": updated_queries_s3
-            })
-
-            updated_cura_map_s3 = {
-                mapping_dict_s3[k]: v
-                for k, v in self.cura_map.items() if k in mapping_dict_s3
-            }
-
-            # Run Stage 3 model
-            s3_model = self._om_model_from_strategy(self.s3_strategy,
-                                                    updated_queries_s3)
-            s3_res = s3_model.get_match_results(
-                cura_map=updated_cura_map_s3,
-                topk=self.topk,
-                test_or_prod=self._test_or_prod)
-
-            # Merge back to original_value
-            s3_res.rename(columns={"original_value": "updated_value"},
-                          inplace=True)
-            s3_res = pd.merge(replace_df_s3,
-                              s3_res,
-                              on="updated_value",
-                              how="left")
-            s3_res["curated_ontology"] = s3_res["original_value"].map(
-                self.cura_map).fillna("Not Found")
-            s3_res['stage'] = 3
+            # Stage 3 inference is independent of the queries that stay in
+            # Stage 2; overlap it with the Stage 2 topk materialization below
+            replace_df_s2 = replace_df.loc[~s3_mask]
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                s3_future = executor.submit(self._run_stage3,
+                                            replace_df.loc[s3_mask],
+                                            updated_cura_map)
+
+                s2_frames = []
+                if not replace_df_s2.empty:
+                    s2_model.query = updated_for_s2.tolist()
+                    s2_res = self._stage2_results(s2_model, replace_df_s2,
+                                                  updated_cura_map)
+                    s2_frames.append(s2_res)
+                    self._logger.info(
+                        f"Stage 2 completed: {len(s2_res)} queries")
+
+                s3_res = s3_future.result()
 
             self._logger.info(f"Stage 3 completed: {len(s3_res)} queries")
 
-            # Remove Stage 2 results for queries that went to Stage 3
-            s2_res_filtered = s2_res[~s2_res['original_value'].
-                                     isin(queries_for_s3)].copy()
-
-            # Combine all stages: Stage 1 + Stage 2 (filtered) + Stage 3
-            combined_results = pd.concat([exact_df, s2_res_filtered, s3_res],
+            # Combine all stages: Stage 1 + Stage 2 (kept) + Stage 3
+            combined_results = pd.concat([exact_df, *s2_frames, s3_res],
                                          ignore_index=True)
 
             # Final summary
@@ -411,7 +513,7 @@ class OntoMapEngine:
             self._logger.info("=" * 50)
             self._logger.info(f"Stage 1 (Exact): {len(exact_df)} queries")
             self._logger.info(
-                f"Stage 2 ({self.s2_strategy.upper()}): {len(s2_res_filtered)} queries"
+                f"Stage 2 ({self.s2_strategy.upper()}): {len(replace_df_s2)} queries"
             )
             self._logger.info(
                 f"Stage 3 ({self.s3_strategy.upper()}): {len(s3_res)} queries")
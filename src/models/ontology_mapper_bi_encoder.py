@@ -1,4 +1,5 @@
 import sys
+import numpy as np
 import pandas as pd
 import requests
 from tqdm.auto import tqdm
@@ -29,9 +30,16 @@ class OntoMapBIE(OntoModelsBase):
                          corpus,
                          query_df=query_df,
                          corpus_df=corpus_df)
+        self._code2name = None
         self.logger.info("Initialized Bi-Encoder (query with context) module")
-        self.code2name = self.load_oncotree_mapping(
-            "data/corpus/oncotree_code_to_name.csv")
+
+    @property
+    def code2name(self) -> dict:
+        # Only needed when query context has to be built
+        if self._code2name is None:
+            self._code2name = self.load_oncotree_mapping(
+                "data/corpus/oncotree_code_to_name.csv")
+        return self._code2name
 
     def load_oncotree_mapping(self, path: str) -> dict:
         df = pd.read_csv(path)
@@ -113,31 +121,32 @@ class OntoMapBIE(OntoModelsBase):
                                                        as_documents=True)
             all_results.append(hits)
 
-        df = pd.DataFrame({
-            'original_value':
-            orig_queries,
-            'ctx_query':
-            ctx_queries,
-            'curated_ontology': [
-                cura_map.get(q, "Not Found")
-                if test_or_prod == 'test' else "N/A" for q in orig_queries
-            ]
-        })
-
+        curated = [
+            cura_map.get(q, "Not Found") if test_or_prod == 'test' else "N/A"
+            for q in orig_queries
+        ]
+        # (n_queries, k) arrays of matched terms (padded with "N/A") and
+        # float32 scores (padded with NaN)
+        top_terms = np.array(
+            [[hits[i].metadata['term'] if i < len(hits) else "N/A"
+              for i in range(k)] for hits in all_results],
+            dtype=object).reshape(len(all_results), k)
+        top_scores = np.array(
+            [[hits[i].metadata['score'] if i < len(hits) else np.nan
+              for i in range(k)] for hits in all_results],
+            dtype=np.float32).reshape(len(all_results), k)
+
+        cols = {
+            'original_value': orig_queries,
+            'ctx_query': ctx_queries,
+            'curated_ontology': curated
+        }
         for i in range(k):
-            df[f'top{i+1}_match'] = [
-                hits[i].metadata['term'] if i < len(hits) else "N/A"
-                for hits in all_results
-            ]
-            df[f'top{i+1}_score'] = [
-                f"{hits[i].metadata['score']:.4f}" if i < len(hits) else "N/A"
-                for hits in all_results
-            ]
-
-        df['match_level'] = df.apply(lambda row: next(
-            (j + 1 for j in range(k)
-             if row[f'top{j+1}_match'] == row['curated_ontology']), 99),
-                                     axis=1)
+            cols[f'top{i+1}_match'] = top_terms[:, i]
+            cols[f'top{i+1}_score'] = top_scores[:, i]
+        cols['match_level'] = self.calc_match_level(top_terms, curated)
+
+        df = pd.DataFrame(cols)
 
         self.logger.info("Bi-Encoder Results Generated")
         return df
@@ -61,8 +61,9 @@ class OntoMapLM(otm.OntoModelsBase):
             AutoTokenizer or None: The tokenizer instance if from_tokenizer is True, otherwise None.
         """
         if self.from_tokenizer:
-            self._tokenizer = AutoTokenizer.from_pretrained(
-                self.method_model_dict[self.method])
+            if self._tokenizer is None:
+                self._tokenizer = AutoTokenizer.from_pretrained(
+                    self.method_model_dict[self.method])
             return self._tokenizer
         else:
             return None
@@ -194,36 +195,44 @@ class OntoMapLM(otm.OntoModelsBase):
         raise NotImplementedError(
             "get_match_results_mp will be implemented later")
 
+    def get_top1_scores(self, topk: int = None) -> pd.DataFrame:
+        """
+        Returns only the top1 score per query. The topk search behind it is
+        cached, so get_match_results on any subset of the queries reuses it.
+
+        Args:
+            topk (int, optional): Hits to search and cache per query. Defaults to self.topk.
+
+        Returns:
+            pd.DataFrame: original_value and float32 top1_score per query.
+        """
+        D, _ = self.search_queries(topk or self.topk)
+
+        return pd.DataFrame({
+            "original_value": self.query,
+            "top1_score": D[:, 0].astype(np.float32)
+        })
+
     def get_match_results(self,
                           cura_map: dict[str, str] = None,
                           topk: int = 5,
                           test_or_prod: str = 'test') -> pd.DataFrame:
-        idx = self.vector_store.index
-
-        q_embs = self.create_embeddings(self.query, convert_to_tensor=False)
-        q_mat = np.array(q_embs, dtype="float32")
-
-        D, I = idx.search(q_mat, topk)
-
-        rows = []
-        for qi, q in enumerate(self.query):
-            top_ids = I[qi]
-            top_scores = D[qi].tolist()
-            top_terms = [self.corpus[i] for i in top_ids]
-
-            curated = (cura_map.get(q, "Not Found") if test_or_prod == 'test'
-                       else "Not Available for Prod Environment")
-            lvl = next(
-                (i + 1 for i, t in enumerate(top_terms) if t == curated), 99)
-
-            row = {
-                "original_value": q,
-                "curated_ontology": curated,
-                "match_level": lvl
-            }
-            for i, (t, s) in enumerate(zip(top_terms, top_scores), start=1):
-                row[f"top{i}_match"] = t
-                row[f"top{i}_score"] = f"{s:.4f}"
-            rows.append(row)
-
-        return pd.DataFrame(rows)
+        D, I = self.search_queries(topk)
+
+        # (n_queries, topk) arrays of matched terms and scores
+        top_terms = np.asarray(self.corpus, dtype=object)[I]
+        curated = [
+            cura_map.get(q, "Not Found") if test_or_prod == 'test' else
+            "Not Available for Prod Environment" for q in self.query
+        ]
+
+        cols = {
+            "original_value": self.query,
+            "curated_ontology": curated,
+            "match_level": self.calc_match_level(top_terms, curated)
+        }
+        for i in range(top_terms.shape[1]):
+            cols[f"top{i+1}_match"] = top_terms[:, i]
+            cols[f"top{i+1}_score"] = D[:, i].astype(np.float32)
+
+        return pd.DataFrame(cols)
@@ -1,4 +1,5 @@
 import sys
+import numpy as np
 import pandas as pd
 from tqdm.auto import tqdm
 from src.models.ontology_models import OntoModelsBase
@@ -42,28 +43,28 @@ class OntoMapRAG(OntoModelsBase):
                 query=q, k=topk, as_documents=True)
             results.append(search_results)
 
-        df = pd.DataFrame({
-            'original_value':
-            self.query,
-            'curated_ontology': [
-                cura_map.get(q, "Not Found") if test_or_prod == 'test' else
-                "Not Available for Prod Environment" for q in self.query
-            ]
-        })
+        curated = [
+            cura_map.get(q, "Not Found") if test_or_prod == 'test' else
+            "Not Available for Prod Environment" for q in self.query
+        ]
+        # (n_queries, topk) arrays of matched terms (padded with "N/A") and
+        # float32 scores (padded with NaN)
+        top_terms = np.array(
+            [[r[i].metadata['term'] if i < len(r) else "N/A"
+              for i in range(topk)] for r in results],
+            dtype=object).reshape(len(results), topk)
+        top_scores = np.array(
+            [[r[i].metadata['score'] if i < len(r) else np.nan
+              for i in range(topk)] for r in results],
+            dtype=np.float32).reshape(len(results), topk)
 
+        cols = {'original_value': self.query, 'curated_ontology': curated}
         for i in range(topk):
-            df[f'top{i+1}_match'] = [
-                r[i].metadata['term'] if i < len(r) else "N/A" for r in results
-            ]
-            df[f'top{i+1}_score'] = [
-                f"{r[i].metadata['score']:.4f}" if i < len(r) else "N/A"
-                for r in results
-            ]
+            cols[f'top{i+1}_match'] = top_terms[:, i]
+            cols[f'top{i+1}_score'] = top_scores[:, i]
+        cols['match_level'] = self.calc_match_level(top_terms, curated)
 
-        df['match_level'] = df.apply(lambda row: next(
-            (i + 1 for i in range(topk)
-             if row[f'top{i+1}_match'] == row['curated_ontology']), 99),
-                                     axis=1)
+        df = pd.DataFrame(cols)
 
         self.logger.info("Results Generated")
         return df
@@ -1,4 +1,5 @@
 from sentence_transformers import util
+import numpy as np
 import pandas as pd
 import torch
 from src.KnowledgeDb.faiss_sqlite_pipeline import FAISSSQLiteSearch
@@ -49,6 +50,7 @@ class OntoModelsBase:
                 f"Method name should be one of {self.list_of_methods}")
 
         self.topk = topk
+        self._search_cache = {}
         self.logger = CustomLogger().custlogger(loglevel='INFO')
 
     @property
@@ -83,6 +85,56 @@ class OntoModelsBase:
         cosine_sim_df = pd.DataFrame(cosine_scores)
         return cosine_sim_df
 
+    @staticmethod
+    def calc_match_level(top_terms: np.ndarray, curated: list) -> np.ndarray:
+        """
+        Computes the 1-based rank of the curated term within each row of topk matches
+
+        ARGS:
+            top_terms: (n_queries, topk) array of matched terms
+            curated: curated term per query
+
+        RETURNS:
+            numpy int array with the match level per query, 99 when not in the topk
+        """
+        hits = top_terms == np.asarray(curated, dtype=object)[:, None]
+        return np.where(hits.any(axis=1), hits.argmax(axis=1) + 1, 99)
+
+    def search_queries(self, topk: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Searches the vector index for self.query, caching (scores, ids) per query.
+        The flat index scans every vector whatever k is, so a query is encoded
+        and searched once with topk, and later calls on a subset of the
+        queries are served from the cache.
+
+        ARGS:
+            topk: number of hits per query
+
+        RETURNS:
+            tuple of (D, I) numpy arrays of shape (len(self.query), topk)
+        """
+        missing = [
+            q for q in dict.fromkeys(self.query)
+            if q not in self._search_cache
+            or len(self._search_cache[q][0]) < topk
+        ]
+        if missing:
+            q_mat = np.array(self.create_embeddings(missing,
+                                                    convert_to_tensor=False),
+                             dtype="float32")
+            D, I = self.vector_store.index.search(
+                self._prepare_query_matrix(q_mat), topk)
+            self._search_cache.update(zip(missing, zip(D, I)))
+        D = np.stack([self._search_cache[q][0][:topk] for q in self.query])
+        I = np.stack([self._search_cache[q][1][:topk] for q in self.query])
+        return D, I
+
+    def _prepare_query_matrix(self, q_mat: np.ndarray) -> np.ndarray:
+        """
+        Hook for child classes to transform query embeddings before the index search.
+        """
+        return q_mat
+
     ##### To be implemented in the child class #####
     def create_embeddings(self):
         """